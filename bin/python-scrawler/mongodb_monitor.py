@@ -3,28 +3,21 @@
 Simple MongoDB progress monitor for URL scraping
 """
 
+import asyncio
 import os
-import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 from pymongo.errors import ConnectionFailure
 from dotenv import load_dotenv
 
 # Load environment variables from Laravel .env file
-env_path = Path(__file__).parent.parent.parent / '.env'
+env_path = Path(__file__).resolve().parents[2] / '.env'
 if env_path.exists():
     load_dotenv(env_path)
     print(f"[INFO] Loaded .env from: {env_path}")
 else:
-    print(f"[WARNING] .env file not found at: {env_path}")
-    # Try alternative path
-    alt_env_path = Path(__file__).parent.parent.parent.absolute() / '.env'
-    if alt_env_path.exists():
-        load_dotenv(alt_env_path)
-        print(f"[INFO] Loaded .env from: {alt_env_path}")
-    else:
-        print(f"[ERROR] .env file not found at: {alt_env_path}")
+    print(f"[ERROR] .env file not found at: {env_path}")
 
 # Build MongoDB connection string from .env variables
 DB_HOST = os.getenv('DB_HOST', '127.0.0.1')
@@ -46,11 +39,15 @@ COLLECTION_NAME = "urls"
 
 print(f"[INFO] Using MongoDB connection: {MONGO_CONNECTION_STRING.replace(DB_PASSWORD, '***' if DB_PASSWORD else '')}")
 
-def connect_to_mongodb():
+async def connect_to_mongodb():
     """Connect to MongoDB"""
     try:
-        client = MongoClient(MONGO_CONNECTION_STRING, serverSelectionTimeoutMS=5000)
-        client.admin.command('ismaster')
+        client = AsyncMongoClient(
+            MONGO_CONNECTION_STRING,
+            serverSelectionTimeoutMS=5000,
+            compressors="zstd,zlib"
+        )
+        await client.admin.command('ismaster')
         db = client[DB_NAME]
         collection = db[COLLECTION_NAME]
         return client, collection
@@ -58,19 +55,52 @@ def connect_to_mongodb():
         print(f"MongoDB connection failed: {e}")
         return None, None
 
-def get_stats(collection):
+async def get_facets(collection, pipeline):
+    """Run a single-document aggregation and return its result"""
+    cursor = await collection.aggregate(pipeline)
+    results = await cursor.to_list(1)
+    return results[0] if results else {}
+
+async def get_stats(collection):
     """Get current statistics"""
     try:
-        total = collection.count_documents({})
-        processed = collection.count_documents({"processed": True})
-        unprocessed = collection.count_documents({"processed": False})
-
-        # Get recently processed (last 10 minutes)
+        # Get processed, unprocessed and recently processed (last 10 minutes)
+        # counts in a single round-trip. $facet sub-pipelines cannot use
+        # indexes, so match and project first to let the planner answer from
+        # the {processed, processed_at} index without fetching documents.
         ten_min_ago = datetime.now(timezone.utc) - timedelta(minutes=10)
-        recent = collection.count_documents({
-            "processed": True,
-            "processed_at": {"$gte": ten_min_ago}
-        })
+        pipeline = [
+            {"$match": {"processed": {"$in": [True, False]}}},
+            {"$project": {"_id": 0, "processed": 1, "processed_at": 1}},
+            {"$facet": {
+                "processed": [
+                    {"$match": {"processed": True}},
+                    {"$count": "n"}
+                ],
+                "unprocessed": [
+                    {"$match": {"processed": False}},
+                    {"$count": "n"}
+                ],
+                "recent": [
+                    {"$match": {"processed": True, "processed_at": {"$gte": ten_min_ago}}},
+                    {"$count": "n"}
+                ]
+            }}
+        ]
+
+        # Run the total and the facet counts concurrently
+        total, facets = await asyncio.gather(
+            collection.estimated_document_count(),
+            get_facets(collection, pipeline)
+        )
+
+        def facet_count(name):
+            result = facets.get(name) or [{}]
+            return result[0].get("n", 0)
+
+        processed = facet_count("processed")
+        unprocessed = facet_count("unprocessed")
+        recent = facet_count("recent")
 
         return {
             "total": total,
@@ -83,18 +113,18 @@ def get_stats(collection):
         print(f"Error getting stats: {e}")
         return None
 
-def monitor():
+async def monitor():
     """Monitor progress"""
     print("MongoDB URL Scraper - Progress Monitor")
     print("=" * 50)
 
-    client, collection = connect_to_mongodb()
+    client, collection = await connect_to_mongodb()
     if collection is None:
-        return
+        raise SystemExit(1)
 
     try:
         while True:
-            stats = get_stats(collection)
+            stats = await get_stats(collection)
             if stats:
                 now = datetime.now().strftime("%H:%M:%S")
                 print(f"[{now}] Total: {stats['total']:,} | "
@@ -107,12 +137,12 @@ def monitor():
                     print("\n🎉 All URLs processed!")
                     break
 
-            time.sleep(30)  # Update every 30 seconds
+            await asyncio.sleep(30)  # Update every 30 seconds
 
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         print("\nMonitoring stopped.")
     finally:
-        client.close()
+        await client.close()
 
 if __name__ == "__main__":
-    monitor()
+    asyncio.run(monitor())
@@ -5,35 +5,42 @@ Goal: Store scraped data directly in MongoDB records, not JSON files
 """
 
 import asyncio
-import json
+import functools
 import os
+import re
+import signal
+import time
 from datetime import datetime, timezone
-from urllib.parse import urljoin
 from pathlib import Path
 
+import orjson
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
-from pymongo import MongoClient, UpdateOne
-from pymongo.errors import ConnectionFailure
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
 from dotenv import load_dotenv
 
 # Load environment variables from Laravel .env file
-env_path = Path(__file__).parent.parent.parent / '.env'
+env_path = Path(__file__).resolve().parents[2] / '.env'
 if env_path.exists():
     load_dotenv(env_path)
     print(f"[INFO] Loaded .env from: {env_path}")
 else:
-    print(f"[WARNING] .env file not found at: {env_path}")
-    # Try alternative path
-    alt_env_path = Path(__file__).parent.parent.parent.absolute() / '.env'
-    if alt_env_path.exists():
-        load_dotenv(alt_env_path)
-        print(f"[INFO] Loaded .env from: {alt_env_path}")
-    else:
-        print(f"[ERROR] .env file not found at: {alt_env_path}")
+    print(f"[ERROR] .env file not found at: {env_path}")
 
 # --- Constants ---
 BASE_URL = "https://open.overheid.nl"
 SEARCH_URL_TEMPLATE = BASE_URL + "/zoeken?zoeken=&pagina={page}"
+PROCESS_CONCURRENCY = 8  # Number of pages scraping detail URLs in parallel
+UPDATE_BATCH_SIZE = 50  # Number of scraped URL updates per bulk write
+UPDATE_FLUSH_INTERVAL = 30  # Seconds before queued updates are written regardless of size
+# Unprocessed URLs per cursor batch; small enough that the workers finish a batch
+# well within MongoDB's 10 minute idle cursor timeout
+UNPROCESSED_BATCH_SIZE = 25
+API_RE = re.compile(r"/api/.*document")  # Document API responses worth capturing
+API_RESPONSE_TIMEOUT = 15  # Seconds to wait for the API response after navigation
+DISPLAY_DATE_FORMAT = "%d-%m-%Y, %H:%M"  # Date format used on the webpage
+FRACTION_RE = re.compile(r"\.(\d+)")  # Fractional seconds in ISO timestamps
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}  # Never needed for scraping
 
 # Build MongoDB connection string from .env variables
 DB_HOST = os.getenv('DB_HOST', '127.0.0.1')
@@ -52,6 +59,8 @@ else:
 
 DB_NAME = DB_DATABASE
 COLLECTION_NAME = "urls"
+PROCESSED_INDEX = [("processed", ASCENDING), ("processed_at", ASCENDING)]
+DUPLICATE_KEY_ERROR = 11000  # MongoDB error code for unique index violations
 
 print(f"[INFO] Using MongoDB connection: {MONGO_CONNECTION_STRING.replace(DB_PASSWORD, '***' if DB_PASSWORD else '')}")
 
@@ -60,65 +69,126 @@ class MongoDBURLScraper:
         self.client = None
         self.db = None
         self.collection = None
+        self.pending_updates = []
+        self.last_flush = time.monotonic()
+        self.processed_index_hint = None
+        self.has_unique_url_index = False
 
     def connect_to_mongodb(self):
         """Establish connection to MongoDB"""
         try:
-            self.client = MongoClient(MONGO_CONNECTION_STRING, serverSelectionTimeoutMS=5000)
+            self.client = MongoClient(
+                MONGO_CONNECTION_STRING,
+                serverSelectionTimeoutMS=5000,
+                maxPoolSize=50,
+                minPoolSize=5,
+                maxIdleTimeMS=300000,
+                retryWrites=True,
+                compressors="zstd,zlib"
+            )
             self.client.admin.command('ismaster')
             print("[SUCCESS] MongoDB connection successful.")
             self.db = self.client[DB_NAME]
             self.collection = self.db[COLLECTION_NAME]
+            self.ensure_indexes()
             return True
         except ConnectionFailure as e:
             print(f"[ERROR] MongoDB connection failed: {e}")
             return False
 
+    def ensure_indexes(self):
+        """Create the indexes backing the scraper and monitor queries"""
+        try:
+            self.collection.create_index(PROCESSED_INDEX, background=True)
+            # Hint the processed queries so the planner cannot pick another plan
+            self.processed_index_hint = PROCESSED_INDEX
+        except OperationFailure as e:
+            print(f"[WARNING] Could not create MongoDB processed index: {e}")
+
+        try:
+            self.collection.create_index([("url", ASCENDING)], unique=True)
+            self.has_unique_url_index = True
+        except OperationFailure as e:
+            print(f"[WARNING] Could not create unique MongoDB url index: {e}")
+            print("[WARNING] Using upserts for new URLs; concurrent runs may insert "
+                  "duplicate urls until existing duplicates are removed")
+
     def store_urls_in_mongodb(self, urls):
         """Store URLs in MongoDB with initial structure"""
         if not urls:
             return 0
 
-        operations = []
-        for url in urls:
-            operations.append(
-                UpdateOne(
-                    {"url": url},
-                    {
-                        "$setOnInsert": {
-                            "url": url,
-                            "processed": False,
-                            "created_at": datetime.now(timezone.utc),
-                            "raw_scraped_data": None,
-                            "formatted_metadata": None
-                        }
-                    },
-                    upsert=True
-                )
-            )
+        # Skip URLs that are already stored so only new ones go over the wire
+        urls = set(urls)
+        existing = {
+            doc["url"]
+            for doc in self.collection.find({"url": {"$in": list(urls)}}, {"url": 1, "_id": 0})
+        }
+        new_urls = urls - existing
+        if not new_urls:
+            return 0
 
-        result = self.collection.bulk_write(operations)
-        return result.upserted_count
+        created_at = datetime.now(timezone.utc)
+        documents = [
+            {
+                "url": url,
+                "processed": False,
+                "created_at": created_at,
+                "raw_scraped_data": None,
+                "formatted_metadata": None
+            }
+            for url in new_urls
+        ]
+
+        if not self.has_unique_url_index:
+            # Without the unique index, upsert so a single run never adds duplicates
+            operations = [
+                UpdateOne({"url": doc["url"]}, {"$setOnInsert": doc}, upsert=True)
+                for doc in documents
+            ]
+            result = self.collection.bulk_write(operations)
+            return result.upserted_count
 
-    def get_unprocessed_urls(self, limit=None):
-        """Get unprocessed URLs from MongoDB"""
         try:
-            query = {"processed": False}
-            cursor = self.collection.find(query)
-            if limit:
-                cursor = cursor.limit(limit)
-
-            urls = list(cursor)
-            print(f"[INFO] Retrieved {len(urls)} unprocessed URLs from MongoDB")
-            return urls
+            result = self.collection.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            details = e.details or {}
+            # URLs inserted concurrently by another run hit the unique url index
+            other_errors = [
+                error for error in details.get('writeErrors', [])
+                if error.get('code') != DUPLICATE_KEY_ERROR
+            ]
+            if other_errors or details.get('writeConcernErrors'):
+                print(f"[ERROR] Error storing URLs in MongoDB: {other_errors or details.get('writeConcernErrors')}")
+                raise
+            return details.get('nInserted', 0)
+
+    def count_unprocessed_urls(self, limit=None):
+        """Count unprocessed URLs in MongoDB"""
+        try:
+            options = {"limit": limit} if limit else {}
+            if self.processed_index_hint:
+                options["hint"] = self.processed_index_hint
+            return self.collection.count_documents({"processed": False}, **options)
         except Exception as e:
-            print(f"[ERROR] Error retrieving URLs from MongoDB: {e}")
-            return []
+            print(f"[ERROR] Error counting URLs in MongoDB: {e}")
+            return 0
 
-    def update_url_with_scraped_data(self, url, raw_data, formatted_data):
-        """Update MongoDB record with scraped data"""
-        try:
-            self.collection.update_one(
+    def get_unprocessed_urls(self, limit=None):
+        """Get a cursor over unprocessed URLs from MongoDB"""
+        query = {"processed": False}
+        cursor = self.collection.find(
+            query, projection={"url": 1, "_id": 0}, hint=self.processed_index_hint
+        ).batch_size(UNPROCESSED_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    async def update_url_with_scraped_data(self, url, raw_data, formatted_data):
+        """Queue a MongoDB record update with scraped data"""
+        self.pending_updates.append(
+            UpdateOne(
                 {"url": url},
                 {
                     "$set": {
@@ -129,36 +199,82 @@ class MongoDBURLScraper:
                     }
                 }
             )
-            print(f"  [SUCCESS] Updated MongoDB record for {url}")
-            
-            # Show brief summary for production
+        )
+
+        # Show brief summary for production; never let it affect the queued update
+        try:
             if formatted_data:
-                title = formatted_data.get('officiele_titel', 'N/A')
+                title = formatted_data.get('officiele_titel') or 'N/A'
                 org = formatted_data.get('verantwoordelijke_label', 'N/A')
                 doc_type = formatted_data.get('documentsoort', 'N/A')
                 print(f"  [INFO] {doc_type} from {org}")
                 print(f"  [INFO] Title: {title[:100]}{'...' if len(title) > 100 else ''}")
         except Exception as e:
-            print(f"  [ERROR] Error updating MongoDB record: {e}")
+            print(f"  [WARNING] Error printing summary for {url}: {e}")
+
+        if (len(self.pending_updates) >= UPDATE_BATCH_SIZE
+                or time.monotonic() - self.last_flush >= UPDATE_FLUSH_INTERVAL):
+            await self.flush_pending_updates()
+
+    async def flush_pending_updates(self):
+        """Write queued record updates to MongoDB in a single bulk operation"""
+        if not self.pending_updates:
+            return 0
+
+        operations = self.pending_updates
+        self.pending_updates = []
+        self.last_flush = time.monotonic()
+        try:
+            # Write off the event loop so the bulk write does not stall the pages
+            result = await asyncio.to_thread(self.collection.bulk_write, operations, ordered=False)
+            print(f"[SUCCESS] Updated {result.matched_count} MongoDB records")
+            return result.matched_count
+        except BulkWriteError as e:
+            details = e.details or {}
+            print(f"[ERROR] {len(details.get('writeErrors', []))} MongoDB record updates failed")
+            return details.get('nMatched', 0)
+        except Exception as e:
+            print(f"[ERROR] Error updating MongoDB records: {e}")
+            return 0
 
-    def format_date_for_display(self, date_string):
+    @staticmethod
+    def format_date_for_display(date_string):
         """Format date string to match webpage display format"""
         if not date_string:
             return ''
+        if not isinstance(date_string, str):
+            return date_string
+        return MongoDBURLScraper.format_date_string(date_string)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def format_date_string(date_string):
+        """Format a non-empty date string; memoized as many documents share dates"""
         try:
-            # Handle ISO format dates with microseconds
             if 'T' in date_string:
-                if '.' in date_string:
-                    date_string = date_string.split('.')[0] + 'Z'
+                # Python 3.10 fromisoformat only accepts 3 or 6 fractional digits
+                date_string = FRACTION_RE.sub(
+                    lambda m: '.' + m.group(1)[:6].ljust(6, '0'), date_string
+                )
                 dt = datetime.fromisoformat(date_string.replace('Z', '+00:00'))
-                return dt.strftime('%d-%m-%Y, %H:%M')
             else:
                 dt = datetime.strptime(date_string, '%Y-%m-%d')
-                return dt.strftime('%d-%m-%Y, %H:%M')
-        except:
+            return dt.strftime(DISPLAY_DATE_FORMAT)
+        except ValueError:
             return date_string
 
+    @staticmethod
+    def slim_api_response(api_response):
+        """Keep only the parts of an API response used by extract_formatted_metadata"""
+        if not isinstance(api_response, dict) or 'document' not in api_response:
+            return api_response
+
+        return {
+            'document': api_response['document'],
+            'versies': (api_response.get('versies') or [])[:1],
+            'plooiIntern': api_response.get('plooiIntern', {})
+        }
+
     def extract_formatted_metadata(self, scraped_data):
         """Extract and format metadata for easy access"""
         if not scraped_data.get('captured'):
@@ -175,6 +291,11 @@ class MongoDBURLScraper:
             return {}
 
         api_data = api_response['document']
+        identifiers = api_data.get('identifiers') or []
+        extra_metadata = api_data.get('extraMetadata') or []
+        versies = api_response.get('versies') or []
+        v0 = versies[0] if versies else {}
+        bestanden = v0.get('bestanden') or []
         metadata = {}
 
         # Basic document information
@@ -182,8 +303,8 @@ class MongoDBURLScraper:
         metadata['timestamp'] = scraped_data.get('timestamp', '')
         metadata['pid'] = api_data.get('pid', '')
         metadata['weblocatie'] = api_data.get('weblocatie', '')
-        metadata['identifiers'] = api_data.get('identifiers', [])
-        metadata['identificatiekenmerk'] = api_data.get('identifiers', [''])[0] if api_data.get('identifiers') else ''
+        metadata['identifiers'] = identifiers
+        metadata['identificatiekenmerk'] = identifiers[0] if identifiers else ''
 
         # Dates
         metadata['creatiedatum'] = api_data.get('creatiedatum', '')
@@ -218,14 +339,14 @@ class MongoDBURLScraper:
             metadata['documentsoort'] = documentsoorten[0].get('label', '')
 
         themas = classificatie.get('themas', [])
-        metadata['themas'] = ', '.join([theme.get('label', '') for theme in themas])
+        metadata['themas'] = ', '.join(theme.get('label', '') for theme in themas)
 
         informatiecategorieen = classificatie.get('informatiecategorieen', [])
-        metadata['woo_informatiecategorie'] = ', '.join([cat.get('label', '') for cat in informatiecategorieen])
-        metadata['informatiecategorieen'] = [cat.get('label', '') for cat in informatiecategorieen]
+        categorie_labels = [cat.get('label', '') for cat in informatiecategorieen]
+        metadata['woo_informatiecategorie'] = ', '.join(categorie_labels)
+        metadata['informatiecategorieen'] = categorie_labels
 
         # Extra metadata with value sets
-        extra_metadata = api_data.get('extraMetadata', [])
         metadata['extra_metadata_fields'] = {}
 
         for extra in extra_metadata:
@@ -234,26 +355,17 @@ class MongoDBURLScraper:
                 for veld in velden:
                     key = veld.get('key', '')
                     values = veld.get('values', [])
+                    first = values[0] if values else ''
                     metadata['extra_metadata_fields'][key] = {
                         'values': values,
-                        'first_value': values[0] if values else '',
-                        'all_values_string': ', '.join(values) if values else ''
+                        'first_value': first,
+                        'all_values_string': ', '.join(values) if len(values) > 1 else first
                     }
-
-                    if key == 'vergaderjaar':
-                        metadata['vergaderjaar'] = values[0] if values else ''
-                        metadata['vergaderjaar_values'] = values
-                    elif key == 'documentsubsoort':
-                        metadata['documentsubsoort'] = values[0] if values else ''
-                        metadata['documentsubsoort_values'] = values
-                    else:
-                        metadata[key] = values[0] if values else ''
-                        metadata[f'{key}_values'] = values
+                    metadata[key] = first
+                    metadata[f'{key}_values'] = values
 
         # File information
-        versies = api_response.get('versies', [])
         if versies:
-            bestanden = versies[0].get('bestanden', [])
             if bestanden:
                 bestand = bestanden[0]
                 mime_type = bestand.get('mime-type', '')
@@ -268,49 +380,79 @@ class MongoDBURLScraper:
                 metadata['download_url'] = bestand.get('url', '')
                 metadata['hash'] = bestand.get('hash', '')
 
-            metadata['gepubliceerd_op'] = self.format_date_for_display(versies[0].get('openbaarmakingsdatum', ''))
-            metadata['laatst_gewijzigd'] = self.format_date_for_display(versies[0].get('mutatiedatumtijd', ''))
-            metadata['openbaarmakingsdatum'] = versies[0].get('openbaarmakingsdatum', '')
-            metadata['mutatiedatumtijd'] = versies[0].get('mutatiedatumtijd', '')
+            openbaarmakingsdatum = v0.get('openbaarmakingsdatum', '')
+            mutatiedatumtijd = v0.get('mutatiedatumtijd', '')
+            metadata['gepubliceerd_op'] = self.format_date_for_display(openbaarmakingsdatum)
+            metadata['laatst_gewijzigd'] = self.format_date_for_display(mutatiedatumtijd)
+            metadata['openbaarmakingsdatum'] = openbaarmakingsdatum
+            metadata['mutatiedatumtijd'] = mutatiedatumtijd
 
         # Internal PLOOI information
         plooi_intern = api_response.get('plooiIntern', {})
         metadata['aanbieder'] = plooi_intern.get('aanbieder', '')
         metadata['source_label'] = plooi_intern.get('sourceLabel', '')
         metadata['publicatiestatus'] = plooi_intern.get('publicatiestatus', '')
-        metadata['raw_extra_metadata'] = api_data.get('extraMetadata', [])
+        metadata['raw_extra_metadata'] = extra_metadata
 
         return metadata
 
     async def scrape_url_details(self, page, detail_url):
-        """Scrape detailed information from a single URL"""
+        """Scrape detailed information from a single URL; None if it should be retried"""
         print(f"[SCRAPING] {detail_url}")
         captured_json = []
+        capture_tasks = []
 
-        async def on_response(response):
+        async def capture_response(response):
             try:
                 content_type = response.headers.get("content-type", "")
                 if "application/json" in content_type:
-                    text = await response.text()
-                    if text and len(text) > 10:
+                    body = await response.body()
+                    if body and len(body) > 10:
                         captured_json.append({
                             "url": response.url,
                             "status": response.status,
-                            "json_text": text
+                            "body": body
                         })
             except Exception as e:
                 print(f"  [WARNING] Error capturing response: {e}")
 
+        api_response_received = asyncio.Event()
+
+        def on_response(response):
+            # Skip images, stylesheets, tracking and other API calls outright
+            if not API_RE.search(response.url):
+                return
+            if response.status == 200:
+                api_response_received.set()
+            # Track captures so they can be awaited before parsing
+            capture_tasks.append(asyncio.ensure_future(capture_response(response)))
+
         page.on("response", on_response)
 
         try:
-            await page.goto(detail_url, wait_until="networkidle", timeout=60000)
-            await asyncio.sleep(2.0)
+            await page.goto(detail_url, wait_until="domcontentloaded", timeout=60000)
+            # Wait for the document API response instead of network idle; the
+            # timeout starts once navigation is done, the response may already be in
+            await asyncio.wait_for(api_response_received.wait(), API_RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Leave the record unprocessed so a later run retries it
+            print(f"  [WARNING] No API response received for {detail_url}, will retry later")
+            page.remove_listener("response", on_response)
+            for task in capture_tasks:
+                task.cancel()
+            await asyncio.gather(*capture_tasks, return_exceptions=True)
+            return None
         except Exception as e:
             print(f"  [ERROR] Error navigating to {detail_url}: {e}")
             page.remove_listener("response", on_response)
+            for task in capture_tasks:
+                task.cancel()
+            await asyncio.gather(*capture_tasks, return_exceptions=True)
             return {"detail_url": detail_url, "error": str(e), "captured": []}
 
+        page.remove_listener("response", on_response)
+        await asyncio.gather(*capture_tasks)
+
         # Process captured JSON responses
         result = {"detail_url": detail_url, "captured": [], "timestamp": datetime.now(timezone.utc).isoformat()}
 
@@ -318,24 +460,38 @@ class MongoDBURLScraper:
             print(f"  [SUCCESS] Captured {len(captured_json)} JSON responses")
             for item in captured_json:
                 try:
-                    parsed_data = json.loads(item["json_text"])
+                    parsed_data = orjson.loads(item["body"])
                     result["captured"].append({
                         "response_url": item["url"],
                         "status": item["status"],
-                        "data": parsed_data
+                        "data": self.slim_api_response(parsed_data)
                     })
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     result["captured"].append({
                         "response_url": item["url"],
                         "status": item["status"],
-                        "raw_text": item["json_text"]
+                        "raw_text": item["body"].decode("utf-8", errors="replace")
                     })
         else:
             print("  [INFO] No JSON responses found")
 
-        page.remove_listener("response", on_response)
         return result
 
+    async def new_browser_context(self, browser):
+        """Create a browser context that skips fetching unneeded resources"""
+        context = await browser.new_context(
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+
+        async def block_unneeded_resources(route):
+            if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route("**/*", block_unneeded_resources)
+        return context
+
     async def collect_search_links(self, page, page_num):
         """Collect URLs from search result pages"""
         url = SEARCH_URL_TEMPLATE.format(page=page_num)
@@ -348,14 +504,11 @@ class MongoDBURLScraper:
             print(f"[INFO] No detail links found on page {page_num}")
             return []
 
-        anchors = await page.query_selector_all("a[href*='/details/']")
-        links = set()
-        for a in anchors:
-            href = await a.get_attribute("href")
-            if href:
-                full_url = urljoin(BASE_URL, href)
-                if "/details/" in full_url:
-                    links.add(full_url)
+        # Read all hrefs in one call; anchor.href is already an absolute URL
+        hrefs = await page.eval_on_selector_all(
+            "a[href*='/details/']", "els => els.map(e => e.href)"
+        )
+        links = {href for href in hrefs if href and "/details/" in href}
 
         return list(links)
 
@@ -366,9 +519,7 @@ class MongoDBURLScraper:
 
         async with async_playwright() as pw:
             browser = await pw.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
+            context = await self.new_browser_context(browser)
             page = await context.new_page()
 
             page_num = 1
@@ -393,48 +544,108 @@ class MongoDBURLScraper:
             print(f"[COMPLETE] URL collection finished. Total new URLs: {total_new_urls}")
             await browser.close()
 
-    async def process_unprocessed_urls(self, limit=None):
-        """Process all unprocessed URLs and update MongoDB records"""
+    async def process_unprocessed_urls(self, limit=None, concurrency=PROCESS_CONCURRENCY):
+        """Process all unprocessed URLs and update MongoDB records.
+
+        Returns False when the run could not connect or was interrupted.
+        """
         if not self.connect_to_mongodb():
-            return
+            return False
 
-        urls = self.get_unprocessed_urls(limit=limit)
-        if not urls:
+        total = self.count_unprocessed_urls(limit=limit)
+        if not total:
             print("[INFO] No unprocessed URLs found.")
-            return
+            return True
 
-        print(f"[INFO] Starting to process {len(urls)} URLs...")
+        print(f"[INFO] Starting to process {total} URLs with {concurrency} pages...")
 
         async with async_playwright() as pw:
             browser = await pw.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
-            page = await context.new_page()
+            context = await self.new_browser_context(browser)
 
+            # Bounded queue so the cursor is only read as fast as the workers scrape
+            url_queue = asyncio.Queue(maxsize=concurrency * 2)
             processed_count = 0
-            for url_doc in urls:
+            interrupted = False
+
+            async def process_one(page, url_doc):
+                nonlocal processed_count
                 url = url_doc["url"]
                 try:
                     # Scrape the URL
                     raw_data = await self.scrape_url_details(page, url)
+                    if raw_data is None:
+                        return
                     formatted_data = self.extract_formatted_metadata(raw_data)
 
-                    # Update MongoDB record directly
-                    self.update_url_with_scraped_data(url, raw_data, formatted_data)
+                    # Queue the MongoDB record update
+                    await self.update_url_with_scraped_data(url, raw_data, formatted_data)
                     processed_count += 1
 
-                    print(f"  [SUCCESS] Processed {url} ({processed_count}/{len(urls)})")
+                    print(f"  [SUCCESS] Processed {url} ({processed_count}/{total})")
                     await asyncio.sleep(1)  # Be respectful to the server
 
                 except Exception as e:
                     print(f"  [ERROR] Error processing {url}: {e}")
                     # Still mark as processed to avoid reprocessing
-                    self.update_url_with_scraped_data(url, {"error": str(e)}, {})
+                    await self.update_url_with_scraped_data(url, {"error": str(e)}, {})
+
+            async def worker(page):
+                while True:
+                    url_doc = await url_queue.get()
+                    if url_doc is None:
+                        return
+                    await process_one(page, url_doc)
+
+            workers = [
+                asyncio.create_task(worker(await context.new_page()))
+                for _ in range(concurrency)
+            ]
+
+            # Stop cleanly on SIGTERM (e.g. the PHP wrapper's process timeout)
+            # so queued updates are still written before the process exits
+            loop = asyncio.get_running_loop()
+            try:
+                loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+            except NotImplementedError:
+                pass  # Signal handlers are not supported on Windows event loops
+
+            try:
+                try:
+                    cursor = self.get_unprocessed_urls(limit=limit)
+                    while True:
+                        # Fetch off the event loop so a getMore does not stall the pages
+                        url_doc = await asyncio.to_thread(next, cursor, None)
+                        if url_doc is None:
+                            break
+                        await url_queue.put(url_doc)
+                except Exception as e:
+                    print(f"[ERROR] Error retrieving URLs from MongoDB: {e}")
+
+                for _ in workers:
+                    await url_queue.put(None)
+                await asyncio.gather(*workers)
+            except asyncio.CancelledError:
+                interrupted = True
+                print("[INFO] Processing interrupted, saving scraped URLs...")
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            finally:
+                try:
+                    loop.remove_signal_handler(signal.SIGTERM)
+                except NotImplementedError:
+                    pass
+                await self.flush_pending_updates()
 
             await browser.close()
 
+        if interrupted:
+            print(f"[INTERRUPTED] Processing stopped. Successfully processed {processed_count} URLs.")
+            return False
+
         print(f"[COMPLETE] Processing finished. Successfully processed {processed_count} URLs.")
+        return True
 
     def close_connection(self):
         """Close MongoDB connection"""
@@ -455,7 +666,7 @@ async def process_urls(limit=None):
     """Process unprocessed URLs"""
     scraper = MongoDBURLScraper()
     try:
-        await scraper.process_unprocessed_urls(limit=limit)
+        return await scraper.process_unprocessed_urls(limit=limit)
     finally:
         scraper.close_connection()
 
@@ -469,7 +680,8 @@ if __name__ == "__main__":
         elif sys.argv[1] == "process":
             limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
             print(f"Starting URL processing (limit: {limit})...")
-            asyncio.run(process_urls(limit))
+            if not asyncio.run(process_urls(limit)):
+                sys.exit(1)
         else:
             print("Usage: python mongodb_url_scraper.py [collect|process] [limit]")
     else:
@@ -48,7 +48,7 @@ source venv/bin/activate
 # Install Python dependencies
 echo "Installing Python dependencies..."
 pip install --upgrade pip
-pip install playwright pymongo
+pip install playwright pymongo python-dotenv orjson zstandard
 
 # Install Playwright browsers
 echo "Installing Playwright browsers..."